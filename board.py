@@ -1,184 +1,223 @@
 from __future__ import annotations
 
-import copy
 from math import perm, pi
 from os import path
-import uuid
+import random
 
-from collections import defaultdict
-from typing import Dict, Generator, List, Optional, Set, Tuple
+from typing import Dict, Generator, List, Optional, Tuple
 
-from pieces import Color, King, MovementVector, Piece, PieceType
+from pieces import (ALL_SQUARES, ATTACK_DISPATCH, BLACK, PAWN_ATTACKS, PAWN_DOUBLE_PUSHES, PAWN_PUSHES, PIECE_CODE_COUNT,
+                    SLIDING, WHITE, Color, Piece, PieceType, bishop_attacks, from_0x88, piece_code, rook_attacks, to_0x88)
 
 
-class Square(object):
-    _cols: List[str] = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
-    _rows: List[str] = ['1', '2', '3', '4', '5', '6', '7', '8']
+Square = int
 
-    def __init__(self, col: int, row: int):
-        self.col: int = col
-        self.row: int = row
+OFF_BOARD: Square = -1
 
-    def __hash__(self):
-        return hash(self.get_position())
+_COLS: str = 'abcdefgh'
+_ROWS: str = '12345678'
 
-    def __eq__(self, other: Square) -> bool:
-        return self.get_position() == other.get_position()
+SQUARE_NAMES: List[str] = [ col + row for row in _ROWS for col in _COLS ]
+NAME_TO_SQ: Dict[str, Square] = { name: square for square, name in enumerate(SQUARE_NAMES) }
 
-    def is_valid(self) -> bool:
-        return self.col >= 0 and self.col < len(self._cols) and self.row >= 0 and self.row < len(self._rows)
 
-    def find_diff(self, end: Square) -> Tuple[int, int]:
-        return (end.col - self.col, end.row - self.row)
+def make_square(col: int, row: int) -> Square:
+    return col | row << 3
 
-    def apply_diff(self, cols: int, rows: int) -> Square:
-        new_col = self.col + cols
-        new_row = self.row + rows
-        return Square(new_col, new_row)
 
-    def get_position(self) -> Tuple[str, str]:
-        return (self._cols[self.col], self._rows[self.row])
+def square_col(square: Square) -> int:
+    return square & 7
 
-    def to_name(self) -> str:
-        return "".join(self.get_position())
 
-    @classmethod
-    def from_name(cls, name: str) -> Square:
-        if len(name) != 2:
-            raise ValueError
-        col_name = name[0]
-        row_name = name[1]
-        if col_name not in cls._cols or row_name not in cls._rows:
-            raise ValueError
-        return (cls(cls._cols.index(col_name), cls._rows.index(row_name)))
+def square_row(square: Square) -> int:
+    return square >> 3
 
 
-class CandidateMove(object):
-    def __init__(self, square: Square, vector: MovementVector):
-        self.square: Square = square
-        self.vector: MovementVector = vector
+def apply_diff(square: Square, cols: int, rows: int) -> Square:
+    # Stepped on a 0x88 board, where leaving any edge sets a bit in 0x88.
+    target = to_0x88(square) + cols + rows * 16
+    if target & 0x88:
+        return OFF_BOARD
+    return from_0x88(target)
+
+
+def square_name(square: Square) -> str:
+    return SQUARE_NAMES[square]
+
+
+def square_from_name(name: str) -> Square:
+    if name not in NAME_TO_SQ:
+        raise ValueError
+    return NAME_TO_SQ[name]
+
+
+# Destination square for every (direction, origin) pair, so that walking a vector
+# is a list index rather than a bounds check.
+STEPS: Dict[Tuple[int, int], List[Square]] = {
+    (cols, rows): [ apply_diff(square, cols, rows) for square in range(64) ]
+    for cols in range(-2, 3) for rows in range(-2, 3) if cols or rows
+}
+
+
+def _line_direction(start: Square, end: Square) -> Optional[Tuple[int, int]]:
+    cols = square_col(end) - square_col(start)
+    rows = square_row(end) - square_row(start)
+    if (cols or rows) and (cols == 0 or rows == 0 or abs(cols) == abs(rows)):
+        return (cols > 0) - (cols < 0), (rows > 0) - (rows < 0)
+    return None
+
+
+def _between(start: Square, end: Square) -> int:
+    direction = _line_direction(start, end)
+    if direction is None:
+        return 0
+    steps = STEPS[direction]
+    squares: int = 0
+    square = steps[start]
+    while square != end:
+        squares |= 1 << square
+        square = steps[square]
+    return squares
+
+
+# Squares strictly between two squares on a shared rank, file or diagonal, and 0 for
+# squares that do not share one.
+BETWEEN: List[List[int]] = [ [ _between(start, end) for end in range(64) ] for start in range(64) ]
+
+
+# Zobrist keys: a position's key is the XOR of one random number per (piece, square)
+# plus ZOBRIST_SIDE when black is to move. A fixed seed keeps keys stable across runs.
+_zobrist_random = random.Random(0x5eed)
+_zobrist_keys: Dict[int, List[int]] = {
+    piece_code(color, piece_type): [ _zobrist_random.getrandbits(64) for _ in range(64) ]
+    for piece_type in PieceType for color in Color
+}
+ZOBRIST: List[List[int]] = [ _zobrist_keys.get(code, []) for code in range(PIECE_CODE_COUNT) ]
+ZOBRIST_SIDE: int = _zobrist_random.getrandbits(64)
+
+# Indexed by color.
+OPPONENT: Tuple[Color, Color] = (Color.BLACK, Color.WHITE)
+
+
+def iter_bits(bitboard: int) -> Generator[int, None, None]:
+    while bitboard:
+        lsb = bitboard & -bitboard
+        yield lsb.bit_length() - 1
+        bitboard ^= lsb
+
+
+def toggle_bits(table: List[int], squares: int, bit: int):
+    # Hot-path counterpart of iter_bits: flips `bit` in the entry of every square set in
+    # `squares` without the per-square cost of resuming a generator.
+    while squares:
+        lsb = squares & -squares
+        table[lsb.bit_length() - 1] ^= bit
+        squares ^= lsb
 
 
 class Move(object):
+    __slots__ = ('start', 'end')
+
     def __init__(self, start: Square, end: Square):
         self.start: Square = start
         self.end: Square = end
 
     def __hash__(self):
-        return hash((self.start, self.end))
+        return self.start | self.end << 6
 
     def __eq__(self, other: Move):
         return self.start == other.start and self.end == other.end
 
 
 class EmptyMove(Move):
+    __slots__ = ()
+
     def __init__(self):
         pass
 
 
 class GamePiece(object):
+    __slots__ = ('_id', 'bit', 'piece', 'square', 'attacks')
+
+    _next_id: int = 0
+
     def __init__(self, piece: Piece, square: Square):
-        self._uuid = uuid.uuid4()
+        GamePiece._next_id += 1
+        self._id: int = GamePiece._next_id
+        self.bit: int = 0
         self.piece: Piece = piece
         self.square: Square = square
-        self.possible_squares: Dict[Square, MovementVector] = {}
+        self.attacks: int = 0
 
     def __hash__(self):
-        return hash(self._uuid)
+        return self._id
 
     def __eq__(self, other: GamePiece):
-        return self._uuid == other._uuid
-
-    def _generate_moves(self, vector: MovementVector, square: Square) -> Generator[CandidateMove, None, None]:
-        distance: int = 1
-        new_square = square
-        while True:
-            if distance > vector.max_distance:
-                break
-            if not new_square.is_valid():
-                break
-            self.possible_squares[new_square] = vector
-            yield CandidateMove(new_square, vector)
-            distance += 1
-            new_square = new_square.apply_diff(*vector.direction)
-
-    def initialize_moves(self) -> Generator[Generator[CandidateMove, None, None], None, None]:
-        for vector in self.piece.vectors:
-            yield self._generate_moves(vector, self.square.apply_diff(*vector.direction))
-
-    def update_moves(self, move: Move) -> Generator[Generator[CandidateMove, None, None], None, None]:
-        if move.start in self.possible_squares:
-            yield self._generate_moves(self.possible_squares[move.start], move.start)
-        if move.end in self.possible_squares:
-            yield self._generate_moves(self.possible_squares[move.end], move.end)
+        return self._id == other._id
 
     def move(self, square: Square):
         self.square = square
-        self.possible_squares = {}
-        self.piece.move()
 
 
 class KingLocations(object):
-    def __init__(self, white: Square = Square.from_name("e1"), black: Square =  Square.from_name("e8")):
-        self._locations = {
-            Color.WHITE: white,
-            Color.BLACK: black
-        }
-    
+    __slots__ = ('_locations',)
+
+    def __init__(self, white: Square = NAME_TO_SQ["e1"], black: Square = NAME_TO_SQ["e8"]):
+        self._locations: List[Square] = [white, black]
+
     def get(self, color: Color) -> Square:
         return self._locations[color]
 
     def move(self, move: Move) -> KingLocations:
-        if move.start not in self._locations.values():
+        white, black = self._locations
+        if move.start != white and move.start != black:
             return self
-        else:
-            white = move.end if self._locations[Color.WHITE] == move.start else self._locations[Color.WHITE]
-            black = move.end if self._locations[Color.BLACK] == move.start else self._locations[Color.BLACK]
-            return KingLocations(white, black)
+        return KingLocations(move.end if white == move.start else white, move.end if black == move.start else black)
 
 
 class CheckVectors(object):
+    __slots__ = ('attackers', 'blocking_mask', 'xray')
+
     def __init__(self):
-        self.vectors: List[List[Square]] = []
+        self.attackers: int = 0
+        self.blocking_mask: int = 0
+        # Squares behind the king on a sliding check: the checker's attacks stop at the
+        # king, but it would reach them once the king steps back along the line.
+        self.xray: int = 0
 
     def __bool__(self):
-        return bool(self.vectors)
+        return self.attackers != 0
 
-    def add(self, attacker: Square, king: Square, vector: MovementVector):
-        if not vector.can_capture:
-            raise ValueError
-        path: List[Square] = []
-        distance: int = 0
-        new_square = attacker
-        while True:
-            path.append(new_square)
-            distance += 1
-            if distance > vector.max_distance:
-                raise ValueError
-            new_square = new_square.apply_diff(*vector.direction)
-            if not new_square.is_valid():
-                raise ValueError
-            if new_square == king:
-                break
-        self.vectors.append(path)
-
-    def blocking_squares(self) -> Set[Square]:
-        if len(self.vectors) != 1:
-            return set()
-        return set(self.vectors[0])
+    def add(self, attacker: Square, king: Square, sliding: bool = False):
+        # Checks along a rank, file or diagonal can also be blocked on the squares between.
+        self.attackers |= 1 << attacker
+        self.blocking_mask |= 1 << attacker | BETWEEN[attacker][king]
+        if sliding:
+            behind = STEPS[_line_direction(attacker, king)][king]
+            if behind != OFF_BOARD:
+                self.xray |= 1 << behind
+
+    def is_double(self) -> bool:
+        return self.attackers & self.attackers - 1 != 0
+
+    def blocking_squares(self) -> int:
+        # A double check cannot be blocked or captured away.
+        if self.is_double():
+            return 0
+        return self.blocking_mask
 
 
 class BoardState(object):
+    __slots__ = ('last_move', 'turn', 'next_turn', 'material', 'check_vectors', 'king_squares')
+
     def __init__(self, last_move: Move, turn: Color = Color.WHITE, material: int = 0,
                      checks: CheckVectors = CheckVectors(), king_squares: KingLocations = KingLocations()):
         self.last_move: Move = last_move
         self.turn: Color = turn
-        self.next_turn = Color.WHITE if self.turn == Color.BLACK else Color.BLACK
+        self.next_turn = WHITE if turn == BLACK else BLACK
         self.material: int = material
-        self.check_vectors: Dict[Color, CheckVectors] = {
-            self.turn: checks,
-            self.next_turn: CheckVectors()
-        }
+        self.check_vectors: List[CheckVectors] = [CheckVectors(), CheckVectors()]
+        self.check_vectors[self.turn] = checks
         self.king_squares: KingLocations = king_squares
 
     def take_turn(self):
@@ -187,137 +226,265 @@ class BoardState(object):
         self.next_turn = last_turn
 
 
-class InvalidPositionException(ValueError):
-    def __init__(self, *args: object) -> None:
-        super().__init__(*args)
+class UndoInfo(object):
+    __slots__ = ('move', 'state', 'zkey', 'moved', 'moved_piece', 'captured_piece', 'pieces', 'saved')
+
+    def __init__(self, move: Move, state: BoardState, zkey: int, moved: int, moved_piece: GamePiece, captured_piece: Optional[GamePiece]):
+        self.move: Move = move
+        self.state: BoardState = state
+        self.zkey: int = zkey
+        self.moved: int = moved
+        self.moved_piece: GamePiece = moved_piece
+        self.captured_piece: Optional[GamePiece] = captured_piece
+        self.pieces: List[Tuple[GamePiece, Square, int, int]] = []
+        self.saved: int = 0
 
 
 class Board(object):
-    def __init__(self, position: Dict[Square, GamePiece], state: BoardState,
-                     relevant_piece_squares: Dict[Square, Set[GamePiece]] = defaultdict(set),
-                     available_moves: Dict[GamePiece, Set[Square]] = defaultdict(set)):
+    def __init__(self, position: Dict[Square, GamePiece], state: BoardState):
         self.state = state
-        self._position: Dict[Square, GamePiece] = position
-        self._relevant_piece_squares: Dict[Square, Set[GamePiece]] = relevant_piece_squares
-        self._available_moves: Dict[GamePiece, Set[Square]] = available_moves
+        self._position: List[Optional[GamePiece]] = [None] * 64
+        for square, piece in position.items():
+            self._position[square] = piece
+        # Every piece owns one bit (its index in _pieces); per-square attacker sets and
+        # per-piece move sets are bitboards over those bits and over squares respectively.
+        self._pieces: List[Optional[GamePiece]] = []
+        self._piece_masks: List[int] = [0, 0]
+        self._occupancy: List[int] = [0, 0]
+        # Squares of each kind of piece, as a bitboard per piece code.
+        self._piece_squares: List[int] = [0] * PIECE_CODE_COUNT
+        self._attacked_by: List[int] = [0] * 64
+        self._available_moves: List[int] = []
+        # Squares holding a piece that has moved this game; a move carries the bit with it.
+        self._moved: int = 0
+        self.zkey: int = 0
 
     def rebuild(self):
-        self._relevant_piece_squares = defaultdict(set)
-        self._available_moves = defaultdict(set)
-        for piece in self._position.values():
+        self._pieces = [ piece for piece in self._position if piece is not None ]
+        self._piece_masks = [0, 0]
+        self._occupancy = [0, 0]
+        self._piece_squares = [0] * PIECE_CODE_COUNT
+        self._attacked_by = [0] * 64
+        self._available_moves = [0] * len(self._pieces)
+        self.zkey = 0 if self.state.turn == WHITE else ZOBRIST_SIDE
+        for bit, piece in enumerate(self._pieces):
+            piece.bit = bit
+            piece.attacks = 0
+            self._piece_masks[piece.piece.color] |= 1 << bit
+            self._occupancy[piece.piece.color] |= 1 << piece.square
+            self._piece_squares[piece.piece.code] |= 1 << piece.square
+            self.zkey ^= ZOBRIST[piece.piece.code][piece.square]
+        for piece in self._pieces:
             self.prepare_moves(piece)
 
-    def make_child(self, move: Move):
-        child = Board(
-            copy.copy(self._position),
-            BoardState(
-                move,
-                self.state.turn,
-                self.state.material,
-                self.state.check_vectors[self.state.turn],
-                self.state.king_squares.move(move)
-            ),
-            defaultdict(set, { s: copy.copy(g) for s, g in self._relevant_piece_squares.items() }),
-            defaultdict(set, { g: copy.copy(s) for g, s in self._available_moves.items() })
-        )
-        child.make_move(move)
-        return child
-
-    def make_move(self, move: Move):
-        if move.start not in self._position:
+    def do_move(self, move: Move) -> UndoInfo:
+        moved_piece = self._position[move.start]
+        if moved_piece is None:
             raise ValueError
-        moved_piece = copy.deepcopy(self._position[move.start])
-        del self._available_moves[moved_piece]
-        self._available_moves[moved_piece] = set()
-        for square in moved_piece.possible_squares:
-            if moved_piece in self._relevant_piece_squares[square]:
-                self._relevant_piece_squares[square].discard(moved_piece)
-                self._relevant_piece_squares[square].add(moved_piece)
         if moved_piece.piece.color != self.state.turn:
-            print("Making move: {0} to move".format(self.state.turn.value))
-            print("Making move: {0} {1} on {2} to {3}".format(moved_piece.piece.color.value, moved_piece.piece.type.value, move.start.to_name(), move.end.to_name()))
+            print("Making move: {0} to move".format(self.state.turn.name.lower()))
+            print("Making move: {0} {1} on {2} to {3}".format(moved_piece.piece.color.name.lower(), moved_piece.piece.type.name.lower(), square_name(move.start), square_name(move.end)))
             raise ValueError
-        if move.end in self._position:
-            captured_piece = self._position[move.end]
-            self.state.material += captured_piece.piece.value * (1 if captured_piece.piece.color == Color.BLACK else -1)
-            del self._available_moves[captured_piece]
-            for square in captured_piece.possible_squares:
-                self._relevant_piece_squares[square].discard(captured_piece)
+        captured_piece = self._position[move.end]
+        undo = UndoInfo(move, self.state, self.zkey, self._moved, moved_piece, captured_piece)
+        self.state = BoardState(
+            move,
+            self.state.turn,
+            self.state.material,
+            self.state.check_vectors[self.state.turn],
+            self.state.king_squares.move(move)
+        )
+        self._save_piece(moved_piece, undo)
+        self._clear_moves(moved_piece)
+        if captured_piece is not None:
+            self._save_piece(captured_piece, undo)
+            self._clear_moves(captured_piece)
+            self.state.material += captured_piece.piece.value * (1 if captured_piece.piece.color == BLACK else -1)
+            self._pieces[captured_piece.bit] = None
+            self._piece_masks[captured_piece.piece.color] &= ~(1 << captured_piece.bit)
+            self._occupancy[captured_piece.piece.color] ^= 1 << move.end
+            self._piece_squares[captured_piece.piece.code] ^= 1 << move.end
+            self.zkey ^= ZOBRIST[captured_piece.piece.code][move.end]
+        keys = ZOBRIST[moved_piece.piece.code]
+        self.zkey ^= keys[move.start] ^ keys[move.end] ^ ZOBRIST_SIDE
         moved_piece.move(move.end)
         self._position[move.end] = moved_piece
-        del self._position[move.start]
+        self._position[move.start] = None
+        self._occupancy[moved_piece.piece.color] ^= 1 << move.start | 1 << move.end
+        self._piece_squares[moved_piece.piece.code] ^= 1 << move.start | 1 << move.end
+        self._moved = self._moved & ~(1 << move.start) | 1 << move.end
         self.state.take_turn()
         self.prepare_moves(moved_piece)
-        for piece in self._relevant_piece_squares[move.start] | self._relevant_piece_squares[move.start]:
-            self.prepare_moves(piece, move)
-
-    def prepare_moves(self, piece: GamePiece, move: Optional[Move] = None):
-        if move is None:
-            vectors = piece.initialize_moves()
-        else:
-            vectors = piece.update_moves(move)
-        for vector in vectors:
-            terminated = False
-            for candidate in vector:
-                if not terminated:
-                    self._relevant_piece_squares[candidate.square].add(piece)
-                    if candidate.square in self._position:
-                        terminated = True
-                        held_by: GamePiece = self._position[candidate.square]
-                        if held_by.piece.color != piece.piece.color and candidate.vector.can_capture:
-                            if held_by.piece.type == PieceType.KING:
-                                if held_by.piece.color == self.state.next_turn:
-                                    raise InvalidPositionException
-                                else:
-                                    self.state.check_vectors[held_by.piece.color].add(piece.square, held_by.square, candidate.vector)
-                            self._available_moves[piece].add(candidate.square)
-                        else:
-                            self._available_moves[piece].discard(candidate.square)
-                    else:
-                        if not candidate.vector.can_only_capture:
-                            self._available_moves[piece].add(candidate.square)
-                        else:
-                            self._available_moves[piece].discard(candidate.square)
-                else:
-                    self._relevant_piece_squares[candidate.square].discard(piece)
-                    self._available_moves[piece].discard(candidate.square)
-
-    def generate_legal_moves(self) -> Generator[Board, None, None]:
-        if self.state.check_vectors[self.state.turn]:
-            for board in self._generate_legal_moves_from_check():
-                yield board
+        # Only pieces that reached either end of the move can see a change in their moves.
+        # The moved piece was already updated above, and updating it twice would record
+        # its check twice.
+        affected = (self._attacked_by[move.start] | self._attacked_by[move.end]) & ~(1 << moved_piece.bit)
+        while affected:
+            lsb = affected & -affected
+            piece = self._pieces[lsb.bit_length() - 1]
+            self._save_piece(piece, undo)
+            self.prepare_moves(piece)
+            affected ^= lsb
+        return undo
+
+    def undo_move(self, undo: UndoInfo):
+        attacked_by = self._attacked_by
+        for piece, square, attacks, available in undo.pieces:
+            toggle_bits(attacked_by, attacks ^ piece.attacks, 1 << piece.bit)
+            piece.square = square
+            piece.attacks = attacks
+            self._available_moves[piece.bit] = available
+        move = undo.move
+        self._occupancy[undo.moved_piece.piece.color] ^= 1 << move.start | 1 << move.end
+        self._piece_squares[undo.moved_piece.piece.code] ^= 1 << move.start | 1 << move.end
+        self._position[move.start] = undo.moved_piece
+        self._position[move.end] = None
+        captured_piece = undo.captured_piece
+        if captured_piece is not None:
+            self._occupancy[captured_piece.piece.color] ^= 1 << move.end
+            self._piece_squares[captured_piece.piece.code] ^= 1 << move.end
+            self._position[move.end] = captured_piece
+            self._pieces[captured_piece.bit] = captured_piece
+            self._piece_masks[captured_piece.piece.color] |= 1 << captured_piece.bit
+        self.state = undo.state
+        self.zkey = undo.zkey
+        self._moved = undo.moved
+
+    def has_moved(self, square: Square) -> bool:
+        return bool(self._moved >> square & 1)
+
+    def _save_piece(self, piece: GamePiece, undo: UndoInfo):
+        piece_bit = 1 << piece.bit
+        if undo.saved & piece_bit:
             return
-        for piece, squares in [ (p, s) for (p, s) in self._available_moves.items() if p.piece.color == self.state.turn ]:
-            for square in squares:
-                try:
-                    yield self.make_child(Move(piece.square, square))
-                except InvalidPositionException as e:
-                    continue
-                except Exception as e:
-                    print("Generating legal move: {0} to move".format(self.state.turn.value))
-                    print("Generating legal move: {0} {1} on {2} to {3}".format(piece.piece.color.value, piece.piece.type.value, piece.square.to_name(), square.to_name()))
-                    raise e
-
-    def _generate_legal_moves_from_check(self) -> Generator[Board, None, None]:
-        possible_moves: Dict[GamePiece, Set[Square]] = defaultdict(set)
-        king_square = self.state.king_squares.get(self.state.turn)
-        if king_square not in self._position:
-            raise ValueError
+        undo.saved |= piece_bit
+        undo.pieces.append((piece, piece.square, piece.attacks, self._available_moves[piece.bit]))
+
+    def _clear_moves(self, piece: GamePiece):
+        toggle_bits(self._attacked_by, piece.attacks, 1 << piece.bit)
+        piece.attacks = 0
+        self._available_moves[piece.bit] = 0
+
+    def prepare_moves(self, piece: GamePiece):
+        # Pawns also push, which their attack function does not cover.
+        if piece.piece.type == PieceType.PAWN:
+            attacks, available = self._pawn_moves(piece)
+        else:
+            occupied = self._occupancy[WHITE] | self._occupancy[BLACK]
+            attacks, available = self._attack_moves(piece, ATTACK_DISPATCH[piece.piece.code](piece.square, occupied))
+        toggle_bits(self._attacked_by, attacks ^ piece.attacks, 1 << piece.bit)
+        piece.attacks = attacks
+        self._available_moves[piece.bit] = available
+
+    def _check_king(self, piece: GamePiece, targets: int):
+        # Moves are only generated when legal, so the side that just moved never has its
+        # king attacked and only checks against the side to move are recorded.
+        opponent = OPPONENT[piece.piece.color]
+        king_square = self.state.king_squares.get(opponent)
+        if targets & 1 << king_square and opponent == self.state.turn:
+            self.state.check_vectors[opponent].add(piece.square, king_square, SLIDING[piece.piece.type])
+
+    def _attack_moves(self, piece: GamePiece, targets: int) -> Tuple[int, int]:
+        color = piece.piece.color
+        self._check_king(piece, targets & self._occupancy[OPPONENT[color]])
+        return targets, targets & ~self._occupancy[color]
+
+    def _is_attacked(self, square: Square, color: Color) -> bool:
+        # _attacked_by also tracks the squares in front of pawns, which they cannot capture on.
+        for bit in iter_bits(self._attacked_by[square] & self._piece_masks[color]):
+            piece = self._pieces[bit]
+            if piece.piece.type != PieceType.PAWN or PAWN_ATTACKS[color][piece.square] & 1 << square:
+                return True
+        return False
+
+    def _pin_rays(self, color: Color, king_square: Square) -> Dict[Square, int]:
+        # Enemy sliders that would see the king if only enemy pieces blocked; one with a
+        # single friendly piece in between pins it to the squares up to and including the
+        # pinner.
+        opponent = OPPONENT[color]
+        enemies = self._occupancy[opponent]
+        queens = self._piece_squares[piece_code(opponent, PieceType.QUEEN)]
+        rooks = self._piece_squares[piece_code(opponent, PieceType.ROOK)] | queens
+        bishops = self._piece_squares[piece_code(opponent, PieceType.BISHOP)] | queens
+        pinners = rook_attacks(king_square, enemies) & rooks | bishop_attacks(king_square, enemies) & bishops
+        pins: Dict[Square, int] = {}
+        for square in iter_bits(pinners):
+            blockers = BETWEEN[king_square][square] & self._occupancy[color]
+            if blockers and not blockers & blockers - 1:
+                pins[blockers.bit_length() - 1] = BETWEEN[king_square][square] | 1 << square
+        return pins
+
+    def _pawn_moves(self, piece: GamePiece) -> Tuple[int, int]:
+        color = piece.piece.color
+        captures = PAWN_ATTACKS[color][piece.square]
+        enemies = captures & self._occupancy[OPPONENT[color]]
+        self._check_king(piece, enemies)
+        attacks: int = captures
+        available: int = enemies
+        occupied = self._occupancy[WHITE] | self._occupancy[BLACK]
+        push = PAWN_PUSHES[color][piece.square]
+        attacks |= push
+        if push and not occupied & push:
+            available |= push
+            if not self._moved & 1 << piece.square:
+                push = PAWN_DOUBLE_PUSHES[color][piece.square]
+                attacks |= push
+                if not occupied & push:
+                    available |= push
+        return attacks, available
+
+    def _visit(self, move: Move) -> Generator[Move, None, None]:
+        undo = self.do_move(move)
+        try:
+            yield move
+        finally:
+            self.undo_move(undo)
+
+    def generate_legal_moves(self) -> Generator[Move, None, None]:
+        # Only legal moves are made: the king avoids attacked squares, a check has to be
+        # answered, and pinned pieces stay on their pin ray. Each move is yielded with the
+        # board in the resulting position; it is undone when the next move is requested.
+        turn = self.state.turn
+        opponent = OPPONENT[turn]
+        checks = self.state.check_vectors[turn]
+        king_square = self.state.king_squares.get(turn)
         king = self._position[king_square]
-        for move in self._available_moves[king]:
-            try:
-                yield self.make_child(Move(king.square, move))
-            except InvalidPositionException as e:
-                continue
-        possible_moves[king] = self._available_moves[king]
-        blocking_squares = self.state.check_vectors[self.state.turn].blocking_squares()
-        blocking_pieces: Set[GamePiece] = set()
-        for square in blocking_squares:
-            blocking_pieces.update({ p for p in self._relevant_piece_squares[square] if p.piece.color == self.state.turn })
-        for piece in blocking_pieces:
-            for move in self._available_moves[piece]:
-                if move in blocking_squares:
-                    try:
-                        yield self.make_child(Move(piece.square, move))
-                    except InvalidPositionException as e:
-                        continue
+        if king is None:
+            raise ValueError
+        for square in iter_bits(self._available_moves[king.bit] & ~checks.xray):
+            if not self._is_attacked(square, opponent):
+                yield from self._visit(Move(king_square, square))
+        if checks.is_double():
+            return
+        targets = checks.blocking_squares() if checks else ALL_SQUARES
+        pins = self._pin_rays(turn, king_square)
+        for bit in iter_bits(self._piece_masks[turn] & ~(1 << king.bit)):
+            piece = self._pieces[bit]
+            available = self._available_moves[bit] & targets
+            if piece.square in pins:
+                available &= pins[piece.square]
+            for square in iter_bits(available):
+                yield from self._visit(Move(piece.square, square))
+
+    def perft(self, depth: int) -> int:
+        # Counts the leaf positions reachable in exactly `depth` plies, for checking move
+        # generation against published totals.
+        if depth == 0:
+            return 1
+        if depth == 1:
+            return sum(1 for _ in self.generate_legal_moves())
+        return sum(self.perft(depth - 1) for _ in self.generate_legal_moves())
+
+
+# Known start-position perft totals; run this module to check move generation.
+START_PERFT: List[int] = [1, 20, 400, 8902, 197281]
+
+
+if __name__ == "__main__":
+    from game import Game
+
+    board = Board(Game.generate_starting_position(), BoardState(EmptyMove()))
+    board.rebuild()
+    for depth, expected in enumerate(START_PERFT):
+        nodes = board.perft(depth)
+        print("perft({0}) = {1} ({2})".format(depth, nodes, "ok" if nodes == expected else "expected {0}".format(expected)))
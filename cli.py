@@ -1,8 +1,8 @@
-from collections import defaultdict
-from typing import Dict, List, Tuple
+from collections import defaultdict, deque
+from typing import Deque, Dict, Optional, Tuple
 from cmd import Cmd
 
-from board import Move, Square
+from board import Move, Square, square_from_name, square_name
 from engine import MoveNode, Suggestion
 from game import Game, GameStatus
 from pieces import Color
@@ -12,10 +12,10 @@ def format_move(move: Move, game: Game):
     piece = game.piece_at(move.start)
     if piece is None:
         raise ValueError
-    piece_name = piece.type.value
+    piece_name = piece.type.name.lower()
     capture = game.piece_at(move.end)
     verb = "to" if capture is None else "takes on"
-    return "{piece} on {origin} {verb} {dest}".format(piece=piece_name, origin=move.start.to_name(), verb=verb, dest=move.end.to_name())
+    return "{piece} on {origin} {verb} {dest}".format(piece=piece_name, origin=square_name(move.start), verb=verb, dest=square_name(move.end))
 
 
 def format_suggestion(game: Game, suggestion: Suggestion):
@@ -24,19 +24,19 @@ def format_suggestion(game: Game, suggestion: Suggestion):
 
 
 def print_status(status: GameStatus):
-    print("{color} to move".format(color=status.turn.value))
-    for color, vectors in status.checks.items():
-        if vectors:
-            print("{color} in check".format(color=color.value))
+    print("{color} to move".format(color=status.turn.name.lower()))
+    for color in Color:
+        if status.checks[color]:
+            print("{color} in check".format(color=color.name.lower()))
     if status.material == 0:
         print("No material advantage for either side")
     else:
-        material_favorite = Color.WHITE.value if status.material > 0 else Color.BLACK.value
+        material_favorite = Color.WHITE.name.lower() if status.material > 0 else Color.BLACK.name.lower()
         print("Material advantage of {number} favoring {color}".format(number=abs(status.material), color=material_favorite))
     if status.score == 0:
         print("No engine scored advantage for either side")
     else:
-        engine_favorite = Color.WHITE.value if status.score > 0 else Color.BLACK.value
+        engine_favorite = Color.WHITE.name.lower() if status.score > 0 else Color.BLACK.name.lower()
         print("Engine scored advantage of {score} favoring {color}".format(score=format(abs(status.score), ".2f"), color=engine_favorite))
 
 
@@ -82,23 +82,25 @@ class GamePrompt(Cmd):
         print()
 
     def do_move(self, args):
-        start = input("Which piece would you like to move? Please provide the square name (e.g. \"b2\"): ")
-        while not isinstance(start, Square):
+        start_name = input("Which piece would you like to move? Please provide the square name (e.g. \"b2\"): ")
+        start: Optional[Square] = None
+        while start is None:
             try:
-                start = Square.from_name(start)
+                start = square_from_name(start_name)
             except Exception as e:
-                start = input("Invalid square name! Please try again: ")
-        end = input("Which square should it move to?: ")
-        while not isinstance(end, Square):
+                start_name = input("Invalid square name! Please try again: ")
+        end_name = input("Which square should it move to?: ")
+        end: Optional[Square] = None
+        while end is None:
             try:
-                end = Square.from_name(end)
+                end = square_from_name(end_name)
             except Exception as e:
-                end = input("Invalid square name! Please try again: ")
+                end_name = input("Invalid square name! Please try again: ")
         try:
             self.game.make_move(Move(start, end))
             print("Move made!")
         except Exception as e:
-            print([(move.start.to_name(), move.end.to_name()) for move in self.game.history])
+            print([(square_name(move.start), square_name(move.end)) for move in self.game.history])
             print("The provided move was not valid")
             raise e
         print()
@@ -125,8 +127,7 @@ class GamePrompt(Cmd):
                 do_list = True
         if do_list:
             for node in self.game.engine.root.children.values():
-                move = node.board.state.last_move
-                print(format_move(move, self.game))
+                print(format_move(node.move, self.game))
         print()
 
     def do_tree(self, args):
@@ -134,11 +135,11 @@ class GamePrompt(Cmd):
         confirm = input("Do you want a level-by-level breakdown? (y/N): ")
         if confirm in self.confirmations:
             level_counts: Dict[int, int] = defaultdict(int)
-            level_nodes: List[Tuple[int, MoveNode]] = [(1, self.game.engine.root)]
+            level_nodes: Deque[Tuple[int, MoveNode]] = deque([(1, self.game.engine.root)])
             while level_nodes:
-                level, node = level_nodes.pop(0)
+                level, node = level_nodes.popleft()
                 level_counts[level] += len(node.children)
-                level_nodes.extend([(level + 1, child) for child in node.children.values()])
+                level_nodes.extend((level + 1, child) for child in node.children.values())
             for level in sorted(list(level_counts.keys())):
                 print("Evaluation of level {level} contains {count} nodes".format(level=level, count=level_counts[level]))
         print()
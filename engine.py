@@ -2,12 +2,27 @@ from __future__ import annotations
 
 import math
 
-from collections import defaultdict
+from bisect import bisect_left, insort
 from operator import itemgetter
-from typing import Dict, Generator, List, Optional, Set, Tuple
+from typing import Dict, Generator, List, Optional, Tuple
 
-from board import Board, EmptyMove, Move
-from pieces import Color
+from board import Board, EmptyMove, Move, UndoInfo, square_name
+from pieces import WHITE, Color
+
+
+# Child scores are weighted 1, 1/2, 1/4, ... from the side to move's best reply down;
+# terms below this weight cannot move the total in any meaningful way, so the sum stops there.
+MIN_SCORE_WEIGHT: float = 1e-9
+
+# Released nodes kept for reuse; anything past this is left to the garbage collector so
+# an abandoned subtree does not stay allocated for the rest of the game.
+MAX_POOLED_NODES: int = 100000
+
+_ascending_score = itemgetter(0)
+
+
+def _descending_score(entry: Tuple[float, Move]) -> float:
+    return -entry[0]
 
 
 class Suggestion(object):
@@ -16,117 +31,268 @@ class Suggestion(object):
         self.move: Move = move
 
 
+class TranspositionTable(object):
+    def __init__(self, bits: int = 20):
+        self._mask: int = (1 << bits) - 1
+        self._entries: Dict[int, Tuple[int, float, float]] = {}
+
+    def probe(self, key: int, depth: int) -> Optional[Tuple[float, float]]:
+        entry = self._entries.get(key & self._mask)
+        if entry is None or entry[0] != key or entry[2] < depth:
+            return None
+        return entry[1], entry[2]
+
+    def store(self, key: int, score: float, depth: float):
+        # Replace-always: at most 2 ** bits entries are kept, and a colliding position
+        # simply takes over the slot.
+        self._entries[key & self._mask] = (key, score, depth)
+
+
 class MoveNode(object):
-    def __init__(self, board: Board, parent: Optional[MoveNode] = None):
-        self.board: Board = board
+    __slots__ = ('move', 'key', 'turn', 'material', 'parent', 'move_number', '_score_dirty', '_listed_score',
+                 'children', 'size', 'score', 'sorted_child_scores', 'is_checkmate', 'is_stalemate',
+                 'transposition', 'search_depth')
+
+    def __init__(self, move: Move, board: Board, parent: Optional[MoveNode] = None):
+        self._reset(move, board, parent)
+
+    @classmethod
+    def create(cls, move: Move, board: Board, parent: Optional[MoveNode], pool: List[MoveNode]) -> MoveNode:
+        # Reuses a node released from an abandoned part of the tree when one is available.
+        if not pool:
+            return cls(move, board, parent)
+        node = pool.pop()
+        node._reset(move, board, parent)
+        return node
+
+    def _reset(self, move: Move, board: Board, parent: Optional[MoveNode]):
+        self.move: Move = move
+        self.key: int = board.zkey
+        self.turn: Color = board.state.turn
+        self.material: int = board.state.material
         self.parent: Optional[MoveNode] = parent
         self.move_number = 0 if parent is None else parent.move_number + 1
+        self._score_dirty: bool = True
+        # The score this node is filed under in its parent's sorted_child_scores, if any.
+        # Kept apart from score, which is reset when the node is expanded.
+        self._listed_score: Optional[float] = None
         self._reset_children()
-        self.leaf_nodes.add(self)
-        if self.parent is not None:
-            self.parent.update_child_size(self)
-            self.parent.update_child_leaves(self)
 
     def _reset_children(self):
         self.children: Dict[Move, MoveNode] = {}
         self.size = 1
-        self._child_sizes: Dict[Move, int] = defaultdict(int)
-        self.score: float = self.board.state.material
+        self.score: float = self.material
         self.sorted_child_scores: List[Tuple[float, Move]] = []
-        self.leaf_nodes: Set[MoveNode] = set()
-        self._child_leaves: Dict[Move, Set[MoveNode]] = defaultdict(set)
         self.is_checkmate: bool = False
         self.is_stalemate: bool = False
+        self.transposition: Optional[Tuple[float, float]] = None
+        self.search_depth: float = 0
 
-    def prepare_children(self):
+    def prepare_children(self, board: Board, pool: List[MoveNode]):
+        # A leaf scored from the transposition table is listed in its parent under that
+        # score; it is withdrawn here and listed again once the new subtree is scored.
+        if self.parent is not None and self._listed_score is not None:
+            self.parent._remove_child_score(self)
         self._reset_children()
         try:
-            for board in self.board.generate_legal_moves():
-                child = MoveNode(board, self)
-                move = board.state.last_move
-                self.children[move] = child
+            for move in board.generate_legal_moves():
+                self.children[move] = MoveNode.create(move, board, self, pool)
         except Exception as e:
-            print([(move.start.to_name(), move.end.to_name()) for move in self.get_move_history()])
+            print([(square_name(move.start), square_name(move.end)) for move in self.get_move_history()])
             raise e
         if not self.children:
-            self.leaf_nodes.add(self)
-            if self.board.state.check_vectors[self.board.state.turn]:
+            if board.state.check_vectors[board.state.turn]:
                 self.is_checkmate = True
             else:
                 self.is_stalemate = True
-        if self.parent is not None:
-            self.parent.update_child_size(self)
-            self.parent.update_child_leaves(self)
+        self._invalidate_score()
+        node: Optional[MoveNode] = self
+        while node is not None:
+            node.size += len(self.children)
+            node = node.parent
+
+    def path_from_root(self) -> List[MoveNode]:
+        # Nodes from just below the root down to this one, in the order their moves are made.
+        path: List[MoveNode] = []
+        node = self
+        while node.parent is not None:
+            path.append(node)
+            node = node.parent
+        path.reverse()
+        return path
+
+    def get_root(self) -> MoveNode:
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return node
 
     def get_move_history(self) -> List[Move]:
         if self.parent is not None:
             history = self.parent.get_move_history()
         else:
             history = []
-        if not isinstance(self.board.state.last_move, EmptyMove):
-            history.append(self.board.state.last_move)
+        if not isinstance(self.move, EmptyMove):
+            history.append(self.move)
         return history
 
-    def calculate_score(self) -> float:
-        color_modifier: int = 1 if self.board.state.turn == Color.WHITE else -1
+    def _invalidate_score(self):
+        # A node is only ever clean when its whole subtree is, so the walk up can stop at
+        # the first ancestor that is already dirty.
+        self._score_dirty = True
+        node = self.parent
+        while node is not None and not node._score_dirty:
+            node._score_dirty = True
+            node = node.parent
+
+    def calculate_score(self, transpositions: TranspositionTable) -> float:
+        # Post-order walk over the dirty part of the subtree; clean nodes keep their score.
+        stack: List[Tuple[MoveNode, bool]] = [(self, False)]
+        while stack:
+            node, visited = stack.pop()
+            if not node._score_dirty:
+                continue
+            if node.children and not visited:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children.values() if child._score_dirty)
+            else:
+                node._update_score(transpositions)
+        return self.score
+
+    def _update_score(self, transpositions: TranspositionTable):
+        color_modifier: int = 1 if self.turn == WHITE else -1
         if self.is_checkmate:
             score: float = 100 * color_modifier
+            self.search_depth = math.inf
         elif self.is_stalemate:
             score: float = 0
+            self.search_depth = math.inf
+        elif self.transposition is not None:
+            score, self.search_depth = self.transposition
         elif not self.children:
-            score: float = self.board.state.material
+            score: float = self.material
+            self.search_depth = 0
         else:
             score: float = 0
-            reverse: bool = self.board.state.turn == Color.BLACK
-            self.sorted_child_scores: List[Tuple[float, Move]] = sorted(
-                [ (c.calculate_score(), c.board.state.last_move) for c in self.children.values() ],
-                reverse=reverse, key=itemgetter(0))
-            for index, (child_score, move) in enumerate(self.sorted_child_scores):
-                multiplier: float = math.pow(0.5, index)
-                score = child_score * multiplier
+            multiplier: float = 1
+            for child_score, move in self.sorted_child_scores:
+                if multiplier < MIN_SCORE_WEIGHT:
+                    break
+                score += child_score * multiplier
+                multiplier *= 0.5
+            self.search_depth = 1 + min(c.search_depth for c in self.children.values())
+            transpositions.store(self.key, score, self.search_depth)
+        if self.parent is not None:
+            self.parent._place_child_score(self, score)
         self.score = score
-        return self.score
+        self._score_dirty = False
 
-    def update_child_size(self, child: MoveNode):
-        old_size = self._child_sizes[child.board.state.last_move]
-        self.size -= old_size
-        self.size += child.size
-        self._child_sizes[child.board.state.last_move] = child.size
-        if self.parent is not None:
-            self.parent.update_child_size(self)
+    def _place_child_score(self, child: MoveNode, score: float):
+        # sorted_child_scores is kept best-first for the side to move as children are
+        # rescored, rather than being rebuilt and sorted for every change.
+        if child._listed_score is not None:
+            self._remove_child_score(child)
+        key = _descending_score if self.turn == WHITE else _ascending_score
+        insort(self.sorted_child_scores, (score, child.move), key=key)
+        child._listed_score = score
 
-    def update_child_leaves(self, child: MoveNode):
-        old_leaves = self._child_leaves[child.board.state.last_move]
-        self.leaf_nodes.difference_update(old_leaves)
-        self.leaf_nodes.update(child.leaf_nodes)
-        self._child_leaves[child.board.state.last_move] = child.leaf_nodes
-        if self.parent is not None:
-            self.parent.update_child_leaves(self)
+    def _remove_child_score(self, child: MoveNode):
+        scores = self.sorted_child_scores
+        key = _descending_score if self.turn == WHITE else _ascending_score
+        index = bisect_left(scores, key((child._listed_score, child.move)), key=key)
+        while scores[index][1] != child.move:
+            index += 1
+        del scores[index]
+        child._listed_score = None
 
 
 class Engine(object):
     def __init__(self, start: Board, max_depth: float, max_breadth: float):
-        self.root: MoveNode = MoveNode(start)
+        self.board: Board = start
+        self.root: MoveNode = MoveNode(start.state.last_move, start)
         self.max_depth: float = max_depth
         self.max_breadth: float = max_breadth
         self.depth: int = 0
+        self._tt: TranspositionTable = TranspositionTable()
+        # Unexpanded leaves, kept in tree order so that consecutive entries share most of
+        # their path from the root.
+        self._frontier: List[MoveNode] = [self.root]
+        self._node_pool: List[MoveNode] = []
+        self._score_valid: bool = False
 
     def build_tree(self):
+        # Scoring is left until a score or suggestion is asked for.
         while self.depth < self.max_depth and self.root.size < self.max_breadth:
-            current_leaves: List[MoveNode] = list(self.root.leaf_nodes)
-            for leaf in current_leaves:
-                leaf.prepare_children()
+            self._expand_frontier(self.depth + 1)
             self.depth += 1
-        self.root.calculate_score()
+            self._score_valid = False
+
+    def _ensure_scored(self):
+        if not self._score_valid:
+            self.root.calculate_score(self._tt)
+            self._score_valid = True
+
+    def get_score(self) -> float:
+        self._ensure_scored()
+        return self.root.score
+
+    def _expand_frontier(self, depth: int):
+        # The board is walked from leaf to leaf, unmaking moves back to the deepest node
+        # shared with the previous leaf and making the rest. Leaves whose position has
+        # already been scored at least as deep as this pass would reach are not expanded.
+        frontier, self._frontier = self._frontier, []
+        path: List[MoveNode] = []
+        undos: List[UndoInfo] = []
+        for leaf in frontier:
+            leaf_path = leaf.path_from_root()
+            shared = 0
+            while shared < len(path) and shared < len(leaf_path) and path[shared] is leaf_path[shared]:
+                shared += 1
+            while len(path) > shared:
+                path.pop()
+                self.board.undo_move(undos.pop())
+            for node in leaf_path[shared:]:
+                undos.append(self.board.do_move(node.move))
+                path.append(node)
+            leaf.transposition = self._tt.probe(leaf.key, depth - len(leaf_path))
+            if leaf.transposition is not None:
+                leaf._invalidate_score()
+                self._frontier.append(leaf)
+                continue
+            leaf.prepare_children(self.board, self._node_pool)
+            self._frontier.extend(leaf.children.values())
+        while undos:
+            self.board.undo_move(undos.pop())
 
     def generate_suggestions(self) -> Generator[Suggestion, None, None]:
-        for score, move in reversed(self.root.sorted_child_scores):
+        self._ensure_scored()
+        for score, move in self.root.sorted_child_scores:
             yield Suggestion(score, move)
 
     def get_all_suggestions(self) -> List[Suggestion]:
-        return [ Suggestion(score, move) for (score, move) in reversed(self.root.sorted_child_scores) ]
+        self._ensure_scored()
+        return [ Suggestion(score, move) for (score, move) in self.root.sorted_child_scores ]
 
     def make_move(self, move: Move):
-        self.root = self.root.children[move]
+        old_root = self.root
+        self.root = old_root.children[move]
         self.root.parent = None
+        self._frontier = [ leaf for leaf in self._frontier if leaf.get_root() is self.root ]
+        self._release(old_root)
+        self.board.do_move(move)
         self.depth -= 1
+        self._score_valid = False
+
+    def _release(self, node: MoveNode):
+        # Returns a detached subtree to the node pool, stopping at the current root.
+        pool = self._node_pool
+        stack: List[MoveNode] = [node]
+        while stack and len(pool) < MAX_POOLED_NODES:
+            node = stack.pop()
+            if node is self.root:
+                continue
+            stack.extend(node.children.values())
+            node.children.clear()
+            node.sorted_child_scores.clear()
+            node.parent = None
+            pool.append(node)
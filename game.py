@@ -4,15 +4,15 @@ import math
 
 from typing import Dict, List, Optional, Set
 
-from board import Board, BoardState, CheckVectors, EmptyMove, GamePiece, Move, Square
+from board import Board, BoardState, CheckVectors, EmptyMove, GamePiece, Move, Square, square_from_name
 from engine import Engine, Suggestion
-from pieces import Bishop, Color, King, Knight, Pawn, Piece, Queen, Rook
+from pieces import Color, Piece, PieceType, make_piece
 
 
 class GameStatus(object):
-    def __init__(self, turn: Color, checks: Dict[Color, CheckVectors], material: int, score: float):
+    def __init__(self, turn: Color, checks: List[CheckVectors], material: int, score: float):
         self.turn: Color = turn
-        self.checks: Dict[Color, CheckVectors] = checks
+        self.checks: List[CheckVectors] = checks
         self.material: int = material
         self.score: float = score
 
@@ -40,10 +40,10 @@ class Game(object):
 
     def get_status(self) -> GameStatus:
         return GameStatus(
-            self.engine.root.board.state.turn,
-            self.engine.root.board.state.check_vectors,
-            self.engine.root.board.state.material,
-            self.engine.root.score
+            self.engine.board.state.turn,
+            self.engine.board.state.check_vectors,
+            self.engine.board.state.material,
+            self.engine.get_score()
         )
 
     def make_move(self, move: Move):
@@ -52,47 +52,45 @@ class Game(object):
         self.history.append(move)
 
     def get_board(self) -> Board:
-        return self.engine.root.board
+        return self.engine.board
 
     def piece_at(self, square: Square) -> Optional[Piece]:
-        try:
-            return self.engine.root.board._position[square].piece
-        except KeyError as e:
-            return None
+        game_piece = self.engine.board._position[square]
+        return None if game_piece is None else game_piece.piece
 
     @staticmethod
     def generate_starting_position() -> Dict[Square, GamePiece]:
         return {
-            Square.from_name('a1'): GamePiece(Rook(Color.WHITE), Square.from_name('a1')),
-            Square.from_name('b1'): GamePiece(Knight(Color.WHITE), Square.from_name('b1')),
-            Square.from_name('c1'): GamePiece(Bishop(Color.WHITE), Square.from_name('c1')),
-            Square.from_name('d1'): GamePiece(Queen(Color.WHITE), Square.from_name('d1')),
-            Square.from_name('e1'): GamePiece(King(Color.WHITE), Square.from_name('e1')),
-            Square.from_name('f1'): GamePiece(Bishop(Color.WHITE), Square.from_name('f1')),
-            Square.from_name('g1'): GamePiece(Knight(Color.WHITE), Square.from_name('g1')),
-            Square.from_name('h1'): GamePiece(Rook(Color.WHITE), Square.from_name('h1')),
-            Square.from_name('a2'): GamePiece(Pawn(Color.WHITE), Square.from_name('a2')),
-            Square.from_name('b2'): GamePiece(Pawn(Color.WHITE), Square.from_name('b2')),
-            Square.from_name('c2'): GamePiece(Pawn(Color.WHITE), Square.from_name('c2')),
-            Square.from_name('d2'): GamePiece(Pawn(Color.WHITE), Square.from_name('d2')),
-            Square.from_name('e2'): GamePiece(Pawn(Color.WHITE), Square.from_name('e2')),
-            Square.from_name('f2'): GamePiece(Pawn(Color.WHITE), Square.from_name('f2')),
-            Square.from_name('g2'): GamePiece(Pawn(Color.WHITE), Square.from_name('g2')),
-            Square.from_name('h2'): GamePiece(Pawn(Color.WHITE), Square.from_name('h2')),
-            Square.from_name('a7'): GamePiece(Pawn(Color.BLACK), Square.from_name('a7')),
-            Square.from_name('b7'): GamePiece(Pawn(Color.BLACK), Square.from_name('b7')),
-            Square.from_name('c7'): GamePiece(Pawn(Color.BLACK), Square.from_name('c7')),
-            Square.from_name('d7'): GamePiece(Pawn(Color.BLACK), Square.from_name('d7')),
-            Square.from_name('e7'): GamePiece(Pawn(Color.BLACK), Square.from_name('e7')),
-            Square.from_name('f7'): GamePiece(Pawn(Color.BLACK), Square.from_name('f7')),
-            Square.from_name('g7'): GamePiece(Pawn(Color.BLACK), Square.from_name('g7')),
-            Square.from_name('h7'): GamePiece(Pawn(Color.BLACK), Square.from_name('h7')),
-            Square.from_name('a8'): GamePiece(Rook(Color.BLACK), Square.from_name('a8')),
-            Square.from_name('b8'): GamePiece(Knight(Color.BLACK), Square.from_name('b8')),
-            Square.from_name('c8'): GamePiece(Bishop(Color.BLACK), Square.from_name('c8')),
-            Square.from_name('d8'): GamePiece(Queen(Color.BLACK), Square.from_name('d8')),
-            Square.from_name('e8'): GamePiece(King(Color.BLACK), Square.from_name('e8')),
-            Square.from_name('f8'): GamePiece(Bishop(Color.BLACK), Square.from_name('f8')),
-            Square.from_name('g8'): GamePiece(Knight(Color.BLACK), Square.from_name('g8')),
-            Square.from_name('h8'): GamePiece(Rook(Color.BLACK), Square.from_name('h8'))
+            square_from_name('a1'): GamePiece(make_piece(PieceType.ROOK, Color.WHITE), square_from_name('a1')),
+            square_from_name('b1'): GamePiece(make_piece(PieceType.KNIGHT, Color.WHITE), square_from_name('b1')),
+            square_from_name('c1'): GamePiece(make_piece(PieceType.BISHOP, Color.WHITE), square_from_name('c1')),
+            square_from_name('d1'): GamePiece(make_piece(PieceType.QUEEN, Color.WHITE), square_from_name('d1')),
+            square_from_name('e1'): GamePiece(make_piece(PieceType.KING, Color.WHITE), square_from_name('e1')),
+            square_from_name('f1'): GamePiece(make_piece(PieceType.BISHOP, Color.WHITE), square_from_name('f1')),
+            square_from_name('g1'): GamePiece(make_piece(PieceType.KNIGHT, Color.WHITE), square_from_name('g1')),
+            square_from_name('h1'): GamePiece(make_piece(PieceType.ROOK, Color.WHITE), square_from_name('h1')),
+            square_from_name('a2'): GamePiece(make_piece(PieceType.PAWN, Color.WHITE), square_from_name('a2')),
+            square_from_name('b2'): GamePiece(make_piece(PieceType.PAWN, Color.WHITE), square_from_name('b2')),
+            square_from_name('c2'): GamePiece(make_piece(PieceType.PAWN, Color.WHITE), square_from_name('c2')),
+            square_from_name('d2'): GamePiece(make_piece(PieceType.PAWN, Color.WHITE), square_from_name('d2')),
+            square_from_name('e2'): GamePiece(make_piece(PieceType.PAWN, Color.WHITE), square_from_name('e2')),
+            square_from_name('f2'): GamePiece(make_piece(PieceType.PAWN, Color.WHITE), square_from_name('f2')),
+            square_from_name('g2'): GamePiece(make_piece(PieceType.PAWN, Color.WHITE), square_from_name('g2')),
+            square_from_name('h2'): GamePiece(make_piece(PieceType.PAWN, Color.WHITE), square_from_name('h2')),
+            square_from_name('a7'): GamePiece(make_piece(PieceType.PAWN, Color.BLACK), square_from_name('a7')),
+            square_from_name('b7'): GamePiece(make_piece(PieceType.PAWN, Color.BLACK), square_from_name('b7')),
+            square_from_name('c7'): GamePiece(make_piece(PieceType.PAWN, Color.BLACK), square_from_name('c7')),
+            square_from_name('d7'): GamePiece(make_piece(PieceType.PAWN, Color.BLACK), square_from_name('d7')),
+            square_from_name('e7'): GamePiece(make_piece(PieceType.PAWN, Color.BLACK), square_from_name('e7')),
+            square_from_name('f7'): GamePiece(make_piece(PieceType.PAWN, Color.BLACK), square_from_name('f7')),
+            square_from_name('g7'): GamePiece(make_piece(PieceType.PAWN, Color.BLACK), square_from_name('g7')),
+            square_from_name('h7'): GamePiece(make_piece(PieceType.PAWN, Color.BLACK), square_from_name('h7')),
+            square_from_name('a8'): GamePiece(make_piece(PieceType.ROOK, Color.BLACK), square_from_name('a8')),
+            square_from_name('b8'): GamePiece(make_piece(PieceType.KNIGHT, Color.BLACK), square_from_name('b8')),
+            square_from_name('c8'): GamePiece(make_piece(PieceType.BISHOP, Color.BLACK), square_from_name('c8')),
+            square_from_name('d8'): GamePiece(make_piece(PieceType.QUEEN, Color.BLACK), square_from_name('d8')),
+            square_from_name('e8'): GamePiece(make_piece(PieceType.KING, Color.BLACK), square_from_name('e8')),
+            square_from_name('f8'): GamePiece(make_piece(PieceType.BISHOP, Color.BLACK), square_from_name('f8')),
+            square_from_name('g8'): GamePiece(make_piece(PieceType.KNIGHT, Color.BLACK), square_from_name('g8')),
+            square_from_name('h8'): GamePiece(make_piece(PieceType.ROOK, Color.BLACK), square_from_name('h8'))
         }
@@ -1,110 +1,393 @@
 from __future__ import annotations
 
-import math
+from array import array
+from enum import IntEnum
+from typing import Callable, Dict, List, Optional, Tuple
 
-from enum import Enum
-from typing import List, Tuple
 
+class PieceType(IntEnum):
+    # Values double as indexes into per-type tuples such as PIECE_VALUES.
+    PAWN = 0
+    KNIGHT = 1
+    BISHOP = 2
+    ROOK = 3
+    QUEEN = 4
+    KING = 5
 
-class PieceType(Enum):
-    PAWN = "pawn"
-    KNIGHT = "knight"
-    BISHOP = "bishop"
-    ROOK = "rook"
-    QUEEN = "queen"
-    KING = "king"
 
+PIECE_VALUES: Tuple[int, ...] = (1, 3, 3, 5, 9, 0)
 
-class Color(Enum):
-    WHITE = "white"
-    BLACK = "black"
 
+class Color(IntEnum):
+    # Values double as indexes into per-color lists.
+    WHITE = 0
+    BLACK = 1
 
-class MovementVector(object):
-    def __init__(self, direction: Tuple[int, int], max_distance: float = math.inf, can_capture: bool = True, can_only_capture: bool = False):
-        self.direction = direction
-        self.max_distance = max_distance
-        self.can_capture = can_capture
-        self.can_only_capture = can_only_capture
+
+# Bound once so hot paths do not look Color up on every call.
+WHITE: Color = Color.WHITE
+BLACK: Color = Color.BLACK
+
+
+# A piece code packs color and type into one small int, (color + 1) << 3 | type, so that
+# 0 is left for an empty square. Codes index per-piece tables of PIECE_CODE_COUNT entries.
+EMPTY: int = 0
+PIECE_CODE_COUNT: int = (len(Color) << 3) + len(PieceType)
+
+
+def piece_code(color: Color, piece_type: PieceType) -> int:
+    return (color + 1) << 3 | piece_type
+
+
+def code_color(code: int) -> Color:
+    return Color((code >> 3) - 1)
+
+
+def code_type(code: int) -> PieceType:
+    return PieceType(code & 7)
+
+
+# The longest move on the board; it stands in for "unbounded" so distances stay ints.
+MAX_DISTANCE: int = 7
+
+# A movement vector packed into one int: column and row steps offset by 4 in the low two
+# nibbles, then the maximum distance in three bits and the can_capture and
+# can_only_capture flags.
+MovementVector = int
+
+
+def movement_vector(cols: int, rows: int, max_distance: int = MAX_DISTANCE, can_capture: bool = True,
+                    can_only_capture: bool = False) -> MovementVector:
+    return (cols + 4) | (rows + 4) << 4 | min(max_distance, MAX_DISTANCE) << 8 | can_capture << 11 | can_only_capture << 12
+
+
+def unpack_vector(vector: MovementVector) -> Tuple[int, int, int, bool, bool]:
+    return ((vector & 15) - 4, (vector >> 4 & 15) - 4, vector >> 8 & 7,
+            bool(vector >> 11 & 1), bool(vector >> 12 & 1))
+
+
+# Every serialize() result, indexed by type, color and has_moved.
+SERIALIZE_CACHE: Tuple[Tuple[Tuple[Tuple[str, str, bool], ...], ...], ...] = tuple(
+    tuple(tuple((piece_type.name.lower(), color.name.lower(), moved) for moved in (False, True)) for color in Color)
+    for piece_type in PieceType
+)
+
+
+# Sliders and the king have no vectors: their attacks come from the tables below, which
+# are built from these directions (one step of each for the king).
+ROOK_DIRECTIONS: List[Tuple[int, int]] = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+BISHOP_DIRECTIONS: List[Tuple[int, int]] = [(1, 1), (1, -1), (-1, -1), (-1, 1)]
 
 
 class Piece():
+    __slots__ = ('color', 'code')
+
     value: int = 0
     type: PieceType
-    vectors: List[MovementVector] = []
+    vectors: Tuple[MovementVector, ...] = ()
 
     def __init__(self, color: Color):
         self.color: Color = color
-        self.has_moved: bool = False
+        self.code: int = piece_code(color, self.type)
 
-    def move(self):
-        self.has_moved = True
+    def serialize(self, has_moved: bool) -> Tuple[str, str, bool]:
+        # Whether a piece has moved is tracked by the board (see Board.has_moved).
+        return SERIALIZE_CACHE[self.type][self.color][has_moved]
 
-    def serialize(self) -> Tuple[str, str, bool]:
-        return (self.type.value, self.color.value, self.has_moved)
+
+def _pawn_vectors(direction: int) -> Tuple[MovementVector, ...]:
+    return (
+        movement_vector(0, direction, 1, False),
+        movement_vector(1, direction, 1, True, True),
+        movement_vector(-1, direction, 1, True, True)
+    )
+
+
+# A single push and the two captures, indexed by color. The double push from a pawn's
+# starting square is left to the board, which knows whether the pawn has moved.
+PAWN_VECTORS: Tuple[Tuple[MovementVector, ...], ...] = (
+    _pawn_vectors(1),
+    _pawn_vectors(-1)
+)
 
 
 class Pawn(Piece):
-    value = 1
+    __slots__ = ('vectors',)
+
+    value = PIECE_VALUES[PieceType.PAWN]
     type = PieceType.PAWN
 
     def __init__(self, color: Color):
         super().__init__(color)
-        direction = 1 if self.color == Color.WHITE else -1
-        self.vectors = [
-            MovementVector((0, direction), 2, False),
-            MovementVector((1, direction), 1, True, True),
-            MovementVector((-1, direction), 1, True, True)
-        ]
-
-    def move(self):
-        self.vectors[0].max_distance = 1
-        return super().move()
+        self.vectors = PAWN_VECTORS[color]
 
 
 class Knight(Piece):
-    value = 3
+    __slots__ = ()
+
+    value = PIECE_VALUES[PieceType.KNIGHT]
     type = PieceType.KNIGHT
-    vectors = [
-        MovementVector((1, 2), 1),
-        MovementVector((2, 1), 1),
-        MovementVector((2, -1), 1),
-        MovementVector((1, -2), 1),
-        MovementVector((-1, -2), 1),
-        MovementVector((-2, -1), 1),
-        MovementVector((-2, 1), 1),
-        MovementVector((-1, 2), 1)
-    ]
+    vectors = (
+        movement_vector(1, 2, 1),
+        movement_vector(2, 1, 1),
+        movement_vector(2, -1, 1),
+        movement_vector(1, -2, 1),
+        movement_vector(-1, -2, 1),
+        movement_vector(-2, -1, 1),
+        movement_vector(-2, 1, 1),
+        movement_vector(-1, 2, 1)
+    )
 
 
 class Bishop(Piece):
-    value = 3
+    __slots__ = ()
+
+    value = PIECE_VALUES[PieceType.BISHOP]
     type = PieceType.BISHOP
-    vectors = [
-        MovementVector((1, 1)),
-        MovementVector((1, -1)),
-        MovementVector((-1, -1)),
-        MovementVector((-1, 1))
-    ]
 
 
 class Rook(Piece):
-    value = 5
+    __slots__ = ()
+
+    value = PIECE_VALUES[PieceType.ROOK]
     type = PieceType.ROOK
-    vectors = [
-        MovementVector((1, 0)),
-        MovementVector((0, 1)),
-        MovementVector((-1, 0)),
-        MovementVector((0, -1))
-    ]
 
 
 class Queen(Piece):
-    value = 9
+    __slots__ = ()
+
+    value = PIECE_VALUES[PieceType.QUEEN]
     type = PieceType.QUEEN
-    vectors = Rook.vectors + Bishop.vectors
 
 
 class King(Piece):
+    __slots__ = ()
+
+    value = PIECE_VALUES[PieceType.KING]
     type = PieceType.KING
-    vectors = [ MovementVector(m.direction, 1) for m in Queen.vectors ]
+
+
+# Indexed by PieceType.
+PIECE_CLASSES: Tuple[type, ...] = (Pawn, Knight, Bishop, Rook, Queen, King)
+
+# A piece carries no position or history, so every piece of one type and color behaves
+# the same and a single shared instance serves them all.
+_PIECE_POOL: Dict[Tuple[PieceType, Color], Piece] = {}
+
+
+def make_piece(piece_type: PieceType, color: Color) -> Piece:
+    key = (piece_type, color)
+    piece = _PIECE_POOL.get(key)
+    if piece is None:
+        piece = _PIECE_POOL[key] = PIECE_CLASSES[piece_type](color)
+    return piece
+
+
+ALL_SQUARES: int = (1 << 64) - 1
+
+NOT_A_FILE: int = 0xfefefefefefefefe
+NOT_AB_FILE: int = 0xfcfcfcfcfcfcfcfc
+NOT_H_FILE: int = 0x7f7f7f7f7f7f7f7f
+NOT_GH_FILE: int = 0x3f3f3f3f3f3f3f3f
+
+# Squares that can still be occupied after shifting a bitboard by this many columns;
+# anything else wrapped around from the other edge of the board.
+_COLUMN_GUARDS: Dict[int, int] = {
+    -2: NOT_GH_FILE,
+    -1: NOT_H_FILE,
+    0: ALL_SQUARES,
+    1: NOT_A_FILE,
+    2: NOT_AB_FILE
+}
+
+
+def _shift(bitboard: int, direction: Tuple[int, int]) -> int:
+    cols, rows = direction
+    offset = cols + rows * 8
+    shifted = bitboard << offset if offset >= 0 else bitboard >> -offset
+    return shifted & _COLUMN_GUARDS[cols] & ALL_SQUARES
+
+
+def _step_table(directions: List[Tuple[int, int]]) -> List[int]:
+    table: List[int] = []
+    for square in range(64):
+        targets: int = 0
+        for direction in directions:
+            targets |= _shift(1 << square, direction)
+        table.append(targets)
+    return table
+
+
+# Knights, kings and pawns always reach the same squares from a given square, so their
+# targets are computed once here. Pawn tables are indexed by color, then square.
+def _directions(vectors: Tuple[MovementVector, ...]) -> List[Tuple[int, int]]:
+    return [ unpack_vector(vector)[:2] for vector in vectors ]
+
+
+KNIGHT_ATTACKS: List[int] = _step_table(_directions(Knight.vectors))
+KING_ATTACKS: List[int] = _step_table(ROOK_DIRECTIONS + BISHOP_DIRECTIONS)
+PAWN_PUSHES: List[List[int]] = [
+    _step_table(_directions(Pawn(color).vectors[:1])) for color in Color
+]
+PAWN_DOUBLE_PUSHES: List[List[int]] = [
+    _step_table([ (cols, rows * 2) for cols, rows in _directions(Pawn(color).vectors[:1]) ]) for color in Color
+]
+PAWN_ATTACKS: List[List[int]] = [
+    _step_table(_directions(tuple(v for v in Pawn(color).vectors if unpack_vector(v)[4]))) for color in Color
+]
+
+
+# Sliding attacks are looked up in "fancy magic" tables: the occupancy of a square's
+# relevant rays is hashed to a table index by one multiply and shift. The magics were
+# found offline by random search.
+ROOK_MAGICS: List[int] = [
+    0x008004d08020c000, 0x4040100020004000, 0x0080100080200008, 0x0100200810010004,
+    0x0200081005020020, 0x4100020801000400, 0x0880020000800100, 0x6600008200205401,
+    0x0508800880c001a0, 0x0080402000401001, 0x0011004100102000, 0x00060010a4420008,
+    0x0c00800400800800, 0x0000800400800200, 0x00c2000200040801, 0x000180088006cd00,
+    0x2380004000200040, 0x000041401001a000, 0x2011050010422002, 0x0023030010008820,
+    0x0000828004000800, 0x0d02880110402420, 0x0040140001b01208, 0x0000060000410884,
+    0x1010401480048420, 0x0000400140201000, 0x0080110100402002, 0x0200882300100100,
+    0x1109280280240080, 0x0100040080020080, 0x0400010400421008, 0x2002048200240449,
+    0x8080002000400044, 0x02d0012001400040, 0x2501801001802000, 0x0000180081801000,
+    0x12a4000480800800, 0x0850020080800400, 0x0000010804005042, 0x001041008a000444,
+    0x0008800100450020, 0x0440412010024000, 0x0040200010008080, 0x00800a0010220040,
+    0x1200040008008080, 0x0002000810020004, 0x1800021008040001, 0x0498040c50820021,
+    0x4a00284102088200, 0x0000402200811200, 0x0e01002002104d00, 0x8608008110010880,
+    0x0010080080040080, 0x442a004411880200, 0x2041008432004100, 0x0328010084004200,
+    0x800110624b008001, 0x8201022810804202, 0x0004400a20010011, 0x8001200500100009,
+    0x4412010420081002, 0x4001000400021831, 0x0408008802300104, 0x10060104044094a2
+]
+
+BISHOP_MAGICS: List[int] = [
+    0x1621014200840281, 0x1042504101010080, 0x0210208200400008, 0x04982052400c0040,
+    0xc00c030842300000, 0x00408820080c0000, 0x04048208a0241240, 0x0082110090042000,
+    0x2148083004881b42, 0x8c00040184010200, 0x0123080095220002, 0x000004410220102c,
+    0x1080045040000000, 0x04000a0910080020, 0x4a00008c30088448, 0x9082022128021010,
+    0x00408220840420c0, 0x0008812002208a00, 0xa0021001020c0100, 0xb132200802004214,
+    0x1214002880a00c80, 0x0001050a00820100, 0x0018801208044200, 0x8040482201440c80,
+    0x0020100008500184, 0x0004046110210814, 0x1004020044080010, 0x0401004004004200,
+    0x2111004024044004, 0x10100900008080c8, 0x1004004004023a80, 0x2042002300840140,
+    0x0001111000082008, 0x0444042002020210, 0x1030202802040808, 0x0001200800410104,
+    0x0000440400004100, 0x01488c0900481104, 0x0081080d00308c11, 0x00292e0320820100,
+    0x108a080444004100, 0x0400414828082040, 0x8001040022000401, 0x0008244010452200,
+    0x8061082104004040, 0x4012281002200302, 0x08200800a9004084, 0x0088011120204600,
+    0x00020210020b4000, 0x081422080c142080, 0x0212492422180010, 0x00c8020084040100,
+    0x0008008420820000, 0x0380400244010400, 0x0009d08426840000, 0x1004480084008009,
+    0x1015010110010408, 0x0404148484412000, 0x4108008100411000, 0x10a2000008842400,
+    0x0000000142d04101, 0x0000004418105440, 0x088908a008808100, 0x0020012c50840040
+]
+
+
+# Rays are walked on a 0x88 board (16 columns per row, the right half unused), where a
+# step off any edge sets a bit in 0x88 and a single AND replaces the bounds checks.
+def to_0x88(square: int) -> int:
+    return square + (square & 56)
+
+
+def from_0x88(square: int) -> int:
+    return (square + (square & 7)) >> 1
+
+
+def _0x88_offsets(directions: List[Tuple[int, int]]) -> List[int]:
+    return [ cols + rows * 16 for cols, rows in directions ]
+
+
+def _ray_attacks(square: int, directions: List[Tuple[int, int]], occupancy: int) -> int:
+    attacks: int = 0
+    origin = to_0x88(square)
+    for offset in _0x88_offsets(directions):
+        target = origin + offset
+        while not target & 0x88:
+            bit = 1 << from_0x88(target)
+            attacks |= bit
+            if occupancy & bit:
+                break
+            target += offset
+    return attacks
+
+
+def _relevant_occupancy(square: int, directions: List[Tuple[int, int]]) -> int:
+    mask: int = 0
+    origin = to_0x88(square)
+    for offset in _0x88_offsets(directions):
+        target = origin + offset
+        # The last square of a ray never changes what can be reached, so it is left out.
+        while not (target + offset) & 0x88:
+            mask |= 1 << from_0x88(target)
+            target += offset
+    return mask
+
+
+def _magic_tables(directions: List[Tuple[int, int]], magics: List[int]) -> Tuple[List[int], List[int], List[array]]:
+    masks: List[int] = []
+    shifts: List[int] = []
+    tables: List[array] = []
+    for square in range(64):
+        mask = _relevant_occupancy(square, directions)
+        shift = 64 - bin(mask).count("1")
+        table = [0] * (1 << (64 - shift))
+        subset: int = 0
+        while True:
+            table[((subset * magics[square]) & ALL_SQUARES) >> shift] = _ray_attacks(square, directions, subset)
+            subset = (subset - mask) & mask
+            if not subset:
+                break
+        masks.append(mask)
+        shifts.append(shift)
+        # Stored as packed unsigned 64-bit words rather than a list of int objects.
+        tables.append(array('Q', table))
+    return masks, shifts, tables
+
+
+ROOK_MASKS, ROOK_SHIFTS, ROOK_ATTACKS = _magic_tables(ROOK_DIRECTIONS, ROOK_MAGICS)
+BISHOP_MASKS, BISHOP_SHIFTS, BISHOP_ATTACKS = _magic_tables(BISHOP_DIRECTIONS, BISHOP_MAGICS)
+
+
+def rook_attacks(square: int, occupancy: int) -> int:
+    return ROOK_ATTACKS[square][(((occupancy & ROOK_MASKS[square]) * ROOK_MAGICS[square]) & ALL_SQUARES) >> ROOK_SHIFTS[square]]
+
+
+def bishop_attacks(square: int, occupancy: int) -> int:
+    return BISHOP_ATTACKS[square][(((occupancy & BISHOP_MASKS[square]) * BISHOP_MAGICS[square]) & ALL_SQUARES) >> BISHOP_SHIFTS[square]]
+
+
+def queen_attacks(square: int, occupancy: int) -> int:
+    # Both lookups are inlined rather than calling the two functions above.
+    return (ROOK_ATTACKS[square][(((occupancy & ROOK_MASKS[square]) * ROOK_MAGICS[square]) & ALL_SQUARES) >> ROOK_SHIFTS[square]]
+            | BISHOP_ATTACKS[square][(((occupancy & BISHOP_MASKS[square]) * BISHOP_MAGICS[square]) & ALL_SQUARES) >> BISHOP_SHIFTS[square]])
+
+
+# Leapers take the occupancy too, so every piece's attacks share one signature.
+def knight_attacks(square: int, occupancy: int) -> int:
+    return KNIGHT_ATTACKS[square]
+
+
+def king_attacks(square: int, occupancy: int) -> int:
+    return KING_ATTACKS[square]
+
+
+def pawn_attacks_white(square: int, occupancy: int) -> int:
+    return PAWN_ATTACKS[Color.WHITE][square]
+
+
+def pawn_attacks_black(square: int, occupancy: int) -> int:
+    return PAWN_ATTACKS[Color.BLACK][square]
+
+
+# Whether a piece type attacks along lines that other pieces can block, indexed by PieceType.
+SLIDING: Tuple[bool, ...] = (False, False, True, True, True, False)
+
+# The attack function of every piece, indexed by piece code, so that looking up a piece's
+# attacks is one index and one call whatever its type. Unused codes hold None.
+# Board.prepare_moves generates pawn moves separately and never reads the pawn entries.
+_attack_dispatch: List[Optional[Callable[[int, int], int]]] = [None] * PIECE_CODE_COUNT
+for _color in Color:
+    _attack_dispatch[piece_code(_color, PieceType.KNIGHT)] = knight_attacks
+    _attack_dispatch[piece_code(_color, PieceType.BISHOP)] = bishop_attacks
+    _attack_dispatch[piece_code(_color, PieceType.ROOK)] = rook_attacks
+    _attack_dispatch[piece_code(_color, PieceType.QUEEN)] = queen_attacks
+    _attack_dispatch[piece_code(_color, PieceType.KING)] = king_attacks
+_attack_dispatch[piece_code(Color.WHITE, PieceType.PAWN)] = pawn_attacks_white
+_attack_dispatch[piece_code(Color.BLACK, PieceType.PAWN)] = pawn_attacks_black
+ATTACK_DISPATCH: Tuple[Optional[Callable[[int, int], int]], ...] = tuple(_attack_dispatch)